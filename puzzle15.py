@@ -6,6 +6,11 @@ from math import sqrt
 from functools import total_ordering
 from heapq import heappop, heappush
 
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
 
 
 def dist(puzzle, idx1, idx2):
@@ -442,6 +447,14 @@ def solve(puzzle, solutionFound=None, lowerBound=None):
       solutionFound(tuple(bestSteps))
     if lowerBound and (lowerBound == -1 or len(bestSteps) <= lowerBound):
       return bestSteps
+  return _search(puzzle, bestSteps, solutionFound, lowerBound)
+
+
+def _search(puzzle, bestSteps, solutionFound=None, lowerBound=None,
+            visited=None):
+  """Search the steps that solve the puzzle, starting from the best steps
+  already known (that bound the search). If visited is a dictionary it is
+  used to skip the configurations already reached with fewer steps."""
   # init the frontier with the original puzzle
   frontier = []
   heappush(frontier, Puzzle(puzzle, [], manhattan_dist(puzzle)))
@@ -467,11 +480,268 @@ def solve(puzzle, solutionFound=None, lowerBound=None):
       priority = _compute_priority(currState.puzzle, move, currState.priority)
       # add the new configuration only if we can reach a better solution
       if not bestSteps or (len(currState.steps) + 1 + priority) < len(bestSteps):
-        heappush(frontier, currState.apply_move(move, priority))
+        nextState = currState.apply_move(move, priority)
+        # skip the configurations already reached with fewer steps
+        if visited is not None:
+          key = tuple(nextState.puzzle)
+          if visited.get(key, len(nextState.steps) + 1) <= len(nextState.steps):
+            continue
+          visited[key] = len(nextState.steps)
+        heappush(frontier, nextState)
   # search is over, returns the best steps found
   return bestSteps
 
 
+
+class Solver:
+  """Keep the solution of a puzzle up to date while the puzzle changes.
+  The steps that solve each configuration found along the solutions are
+  kept (up to maxSolutions configurations, then the older ones are
+  dropped). The configurations visited by each search are not kept, since
+  the number of steps made to reach them depends on the puzzle the search
+  started from."""
+
+
+  def __init__(self, puzzle, lowerBound=None, maxSolutions=100000):
+    if not is_solvable(puzzle):
+      raise ValueError('Unsolvable puzzle')
+    self.puzzle = list(puzzle)
+    self.lowerBound = lowerBound
+    self.maxSolutions = maxSolutions
+    self.steps = None
+    # steps known for each configuration found along the solutions
+    self._solutions = {}
+
+  def __repr__(self):
+    """Return a string representation of this instance."""
+    info = 'Solver: {}\nSteps: {}'
+    steps = len(self.steps) if self.steps is not None else None
+    return info.format(self.puzzle, steps)
+
+
+  def _store(self, steps):
+    """Store the steps that solve the current puzzle and the steps that solve
+    each configuration reached along the way."""
+    self.steps = tuple(steps)
+    # drop the older solutions if there is no room for the new ones
+    if len(self._solutions) + len(self.steps) >= self.maxSolutions:
+      self._solutions.clear()
+    puzzle = list(self.puzzle)
+    for i in range(len(self.steps) + 1):
+      # stop storing once the table is full
+      if len(self._solutions) >= self.maxSolutions:
+        break
+      self._solutions[tuple(puzzle)] = self.steps[i:]
+      if i < len(self.steps):
+        x, y = self.steps[i]
+        puzzle[x], puzzle[y] = puzzle[y], puzzle[x]
+    return self.steps
+
+  def solve(self):
+    """Return the steps that solve the current puzzle (an empty tuple if the
+    puzzle is already solved)."""
+    if self.steps is None:
+      steps = self._solutions.get(tuple(self.puzzle))
+      if steps is None:
+        steps = solve(self.puzzle, lowerBound=self.lowerBound) or ()
+      self._store(steps)
+    return self.steps
+
+  def apply(self, move):
+    """Apply the move (a pair of adjacent cells, one of them empty) to the
+    current puzzle and return the steps that solve the new puzzle."""
+    x, y = move
+    empty = self.puzzle.index(len(self.puzzle))
+    if empty not in (x, y) or x + y - empty not in _neighbors(self.puzzle, empty):
+      raise ValueError('Invalid move')
+    # the move has to be (non empty cell, empty cell)
+    x, y = (x, y) if y == empty else (y, x)
+    prevSteps = self.steps
+    self.puzzle[x], self.puzzle[y] = self.puzzle[y], self.puzzle[x]
+    self.steps = None
+    # the move follows or reverses a known solution
+    steps = self._solutions.get(tuple(self.puzzle))
+    if steps is not None or prevSteps is None:
+      return self._store(steps) if steps is not None else self.solve()
+    # reversing the move and following the previous steps is a solution,
+    # and a shorter one can be at most two moves shorter
+    bestSteps = ((y, x),) + prevSteps
+    lowerBound = len(prevSteps) - 1
+    if self.lowerBound and (self.lowerBound == -1 or
+                            len(bestSteps) <= self.lowerBound):
+      return self._store(bestSteps)
+    if self.lowerBound:
+      lowerBound = max(lowerBound, self.lowerBound)
+    steps = _search(self.puzzle, bestSteps, lowerBound=lowerBound, visited={})
+    return self._store(steps)
+
+
+def _beam_pairs(size):
+  """Get the pairs of cells (first, second) that lie on the same row and
+  on the same column."""
+  rows = [(r * size + i, r * size + j) for r in range(size)
+          for i in range(size) for j in range(i + 1, size)]
+  cols = [(i * size + c, j * size + c) for c in range(size)
+          for i in range(size) for j in range(i + 1, size)]
+  return np.array(rows).T, np.array(cols).T
+
+
+def _beam_score(boards, size, rows, cols):
+  """Return the Manhattan distance plus the linear conflicts of each board."""
+  n = size ** 2
+  cells = np.arange(n)
+  # goal row and column of each tile (the empty cell has none)
+  goalRow = np.where(boards == n, -1, (boards.astype(np.intp) - 1) // size)
+  goalCol = np.where(boards == n, -1, (boards.astype(np.intp) - 1) % size)
+  manhattan = (np.abs(goalRow - cells // size) + np.abs(goalCol - cells % size))
+  manhattan = np.where(boards == n, 0, manhattan).sum(axis=1)
+  # two tiles in their goal row (column) but in the reversed order
+  a, b = rows
+  line = a // size
+  rowConflicts = ((goalRow[:, a] == line) & (goalRow[:, b] == line) &
+                  (goalCol[:, a] > goalCol[:, b])).sum(axis=1)
+  a, b = cols
+  line = a % size
+  colConflicts = ((goalCol[:, a] == line) & (goalCol[:, b] == line) &
+                  (goalRow[:, a] > goalRow[:, b])).sum(axis=1)
+  return manhattan + 2 * (rowConflicts + colConflicts)
+
+
+def solve_beam(puzzle, width=1000, maxDepth=None):
+  """Solve the puzzle using a beam search and returns the steps made.
+  At each depth all the moves are expanded at once, and only the width
+  configurations closer to the solved one are kept. Stop the search after
+  maxDepth steps (by default 8 times the number of cells) returning None.
+  Requires NumPy."""
+  if np is None:
+    raise ImportError('NumPy is required by solve_beam')
+  # check if the puzzle is solvable
+  if not is_solvable(puzzle) or is_solved(puzzle):
+    return None
+  n = len(puzzle)
+  size = int(sqrt(n))
+  maxDepth = maxDepth or 8 * n
+  rows, cols = _beam_pairs(size)
+  # the current layer: boards, empty cells and moves that reached them
+  boards = np.array([puzzle], dtype=np.uint8 if n < 256 else np.uint16)
+  empties = np.array([puzzle.index(n)])
+  deltas = np.array([0])
+  # (parent, cell, empty cell) of each configuration of every layer
+  layers = []
+  for _ in range(maxDepth):
+    children, parents, moved, delta = [], [], [], []
+    for d in (-size, -1, 1, size):
+      # the empty cell can't leave the grid or come back
+      if abs(d) == size:
+        valid = (empties + d >= 0) & (empties + d < n)
+      else:
+        valid = (empties % size) + d == (empties + d) % size
+      idx = np.nonzero(valid & (deltas != -d))[0]
+      # slide the neighbor cells in place of the empty ones
+      child = boards[idx]
+      r = np.arange(len(idx))
+      child[r, empties[idx]] = child[r, empties[idx] + d]
+      child[r, empties[idx] + d] = n
+      children.append(child)
+      parents.append(idx)
+      moved.append(empties[idx] + d)
+      delta.append(np.full(len(idx), d))
+    children = np.concatenate(children)
+    parents = np.concatenate(parents)
+    moved = np.concatenate(moved)
+    delta = np.concatenate(delta)
+    # remove the duplicated configurations by packing each board in a key
+    keys = np.ascontiguousarray(children).view(
+      np.dtype((np.void, children.dtype.itemsize * n))).ravel()
+    _, unique = np.unique(keys, return_index=True)
+    priority = _beam_score(children[unique], size, rows, cols)
+    # keep the best configurations only
+    if len(unique) > width:
+      best = np.argpartition(priority, width)[:width]
+      unique, priority = unique[best], priority[best]
+    layers.append((parents[unique], moved[unique], empties[parents[unique]]))
+    solved = np.nonzero(priority == 0)[0]
+    if len(solved):
+      # follow the parents back to the original puzzle
+      i, moves = solved[0], []
+      for parent, cell, empty in reversed(layers):
+        moves.append((int(cell[i]), int(empty[i])))
+        i = parent[i]
+      return tuple(reversed(moves))
+    boards, empties, deltas = children[unique], moved[unique], delta[unique]
+  return None
+
+
+def validate_steps(puzzles, steps, final=False):
+  """Replay many sequences of steps, one for each puzzle, at once.
+  The puzzles are a list (or a 2D array) of configurations with the same
+  size. Every step is a pair of adjacent cells, one of them empty; the steps
+  of each puzzle can be a list or a row of an array padded at the end with
+  (-1, -1) pairs (any other (-1, -1) pair is an illegal step).
+  Returns the index of the first illegal step of each puzzle (-1 if all the
+  steps are legal) and whether each puzzle has been solved, followed by the
+  final configurations if final is True. Requires NumPy."""
+  if np is None:
+    raise ImportError('NumPy is required by validate_steps')
+  if len(puzzles) != len(steps):
+    raise ValueError('Invalid number of steps')
+  # nothing to replay
+  if len(puzzles) == 0:
+    illegal, solved = np.empty(0, dtype=np.intp), np.empty(0, dtype=bool)
+    if final:
+      return illegal, solved, np.empty((0, 0), dtype=np.intp)
+    return illegal, solved
+  boards = np.array(puzzles, dtype=np.intp)
+  if boards.ndim != 2:
+    raise ValueError('Invalid puzzles')
+  count, n = boards.shape
+  size = int(sqrt(n))
+  if size ** 2 != n:
+    raise ValueError('Invalid size')
+  # every puzzle must contain each cell (the empty one included) once
+  if np.any(np.sort(boards, axis=1) != np.arange(1, n + 1)):
+    raise ValueError('Invalid puzzle')
+  if isinstance(steps, np.ndarray):
+    moves = steps.astype(np.intp).reshape(count, -1, 2)
+    # the padding is made of the (-1, -1) pairs at the end of each row
+    padding = (moves[:, :, 0] == -1) & (moves[:, :, 1] == -1)
+    padding = np.logical_and.accumulate(padding[:, ::-1], axis=1)
+    lengths = moves.shape[1] - padding.sum(axis=1)
+  else:
+    # pad the lists of steps to the same length (None has no steps)
+    steps = [() if s is None else s for s in steps]
+    lengths = np.array([len(s) for s in steps], dtype=np.intp)
+    moves = np.full((count, lengths.max(), 2), -1, dtype=np.intp)
+    for i, s in enumerate(steps):
+      if len(s):
+        moves[i, :len(s)] = s
+  illegal = np.full(count, -1, dtype=np.intp)
+  active = np.ones(count, dtype=bool)
+  rows = np.arange(count)
+  empties = np.argmax(boards == n, axis=1)
+  for t in range(moves.shape[1]):
+    x, y = moves[:, t, 0], moves[:, t, 1]
+    active &= t < lengths
+    # the cell to move is the one that isn't empty
+    cell = np.where(x == empties, y, x)
+    inside = (cell >= 0) & (cell < n)
+    rdiff = np.abs(cell // size - empties // size)
+    cdiff = np.abs(cell % size - empties % size)
+    legal = (((x == empties) | (y == empties)) & inside &
+             (rdiff + cdiff == 1))
+    # stop replaying the puzzles at their first illegal step
+    illegal[active & ~legal] = t
+    active &= legal
+    idx, cell = rows[active], cell[active]
+    boards[idx, empties[idx]] = boards[idx, cell]
+    boards[idx, cell] = n
+    empties[idx] = cell
+  solved = (illegal == -1) & np.all(boards == np.arange(1, n + 1), axis=1)
+  if final:
+    return illegal, solved, boards
+  return illegal, solved
+
+
 def display(puzzle):
   """Print a formatted grid."""
   size = int(sqrt(len(puzzle)))